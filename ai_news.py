@@ -1,12 +1,27 @@
+import os
+import hashlib
+import shutil
+import tempfile
+import calendar
+from datetime import date, datetime
+from dateutil.relativedelta import relativedelta
+from functools import lru_cache
 import streamlit as st
 import requests
-from bs4 import BeautifulSoup
+from io import BytesIO
+from lxml import etree
 import pandas as pd
 import re
 import spacy
-from transformers import pipeline
+from spacy.symbols import DATE, EVENT
+import onnxruntime as ort
+from onnxruntime.capi import onnxruntime_pybind11_state as ort_state
+from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTOptimizer, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig, OptimizationConfig
+from transformers import AutoTokenizer, pipeline
 import numpy as np
 import plotly.graph_objects as go
+import ciso8601
 import dateparser 
 
 st.set_page_config(page_title="News Orchestrator", layout="wide", page_icon="📰")
@@ -106,76 +121,178 @@ h2 {
 # -----------------------------------------------------------
 # Load ML Models (Cached for performance)
 # -----------------------------------------------------------
+SUMMARIZER_MODEL = "sshleifer/distilbart-cnn-12-6"
+ONNX_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".onnx_cache")
+ONNX_FILES = ("encoder_model", "decoder_model", "decoder_with_past_model")
+OPTIMIZATION_CONFIG = OptimizationConfig(
+    optimization_level=99,
+    optimize_for_gpu=False,
+    fp16=False,
+    enable_transformers_specific_optimizations=True
+)
+QUANTIZATION_CONFIG = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+# ONNX Runtime raises its own pybind exception types, which don't derive from RuntimeError
+SUMMARIZER_ERRORS = (RuntimeError, IndexError, ort_state.Fail, ort_state.InvalidArgument, ort_state.RuntimeException)
+
+
+def load_quantized_summarizer():
+    """Exports the summarization model to ONNX, fuses and INT8-quantizes it, caching the result on disk."""
+    # Key the cache on model id + configs so changing either triggers a fresh export
+    cache_key = hashlib.sha1(repr((SUMMARIZER_MODEL, OPTIMIZATION_CONFIG, QUANTIZATION_CONFIG)).encode()).hexdigest()[:12]
+    model_dir = os.path.join(ONNX_CACHE_DIR, cache_key)
+    quantized_dir = os.path.join(model_dir, "quantized")
+
+    if not os.path.isdir(quantized_dir):
+        # One-time export -> graph fusion -> dynamic quantization; later runs load straight from disk.
+        # Everything is built in a scratch dir and moved into place at the end, so an interrupted
+        # run never leaves a partial quantized_dir that later starts would try to load.
+        os.makedirs(model_dir, exist_ok=True)
+        build_dir = tempfile.mkdtemp(dir=model_dir)
+        optimized_dir = os.path.join(build_dir, "optimized")
+        staged_dir = os.path.join(build_dir, "quantized")
+
+        try:
+            # The optimizer reads the in-memory export, so the FP32 graphs are never saved separately
+            model = ORTModelForSeq2SeqLM.from_pretrained(SUMMARIZER_MODEL, export=True, use_merged=False)
+            ORTOptimizer.from_pretrained(model).optimize(save_dir=optimized_dir, optimization_config=OPTIMIZATION_CONFIG)
+            for name in ONNX_FILES:
+                quantizer = ORTQuantizer.from_pretrained(optimized_dir, file_name=f"{name}_optimized.onnx")
+                quantizer.quantize(save_dir=staged_dir, quantization_config=QUANTIZATION_CONFIG)
+            model.config.save_pretrained(staged_dir)
+            os.replace(staged_dir, quantized_dir)
+        finally:
+            # Drop the optimized intermediates (and any partial build) once quantization is done
+            shutil.rmtree(build_dir, ignore_errors=True)
+
+    # Let ONNX Runtime use all available cores
+    session_options = ort.SessionOptions()
+    session_options.intra_op_num_threads = os.cpu_count() or 1
+    return ORTModelForSeq2SeqLM.from_pretrained(
+        quantized_dir,
+        encoder_file_name="encoder_model_optimized_quantized.onnx",
+        decoder_file_name="decoder_model_optimized_quantized.onnx",
+        decoder_with_past_file_name="decoder_with_past_model_optimized_quantized.onnx",
+        session_options=session_options
+    )
+
+
+# Models are loaded lazily on first use so the page renders before any weights are read
 @st.cache_resource
-def load_models():
-    """Loads and caches the spaCy NLP model and the summarization pipeline."""
+def load_nlp():
+    """Loads and caches the spaCy NLP model."""
+    # Only NER and sentence boundaries are used downstream (no vectors/.similarity), so prefer the
+    # small model and keep just NER, which has its own embedding layer. The parser depends on the
+    # shared tok2vec, so sentence boundaries come from the rule-based sentencizer instead.
+    disabled = ["tok2vec", "tagger", "parser", "attribute_ruler", "lemmatizer"]
     try:
-        nlp = spacy.load("en_core_web_md")
+        nlp = spacy.load("en_core_web_sm", disable=disabled)
     except:
-        nlp = spacy.load("en_core_web_sm") 
-    
-    # Load Hugging Face Summarization Pipeline
-    summarizer = pipeline("summarization", model="sshleifer/distilbart-cnn-12-6")
-    return nlp, summarizer
+        nlp = spacy.load("en_core_web_md", disable=disabled) 
+    nlp.add_pipe("sentencizer", first=True)
+    return nlp
+
+
+@st.cache_resource
+def load_summarizer():
+    """Loads and caches the Hugging Face summarization pipeline on top of the quantized ONNX Runtime model (CPU)."""
+    tokenizer = AutoTokenizer.from_pretrained(SUMMARIZER_MODEL)
+    # Bound inputs to distilbart's 1024-token window so truncation=True caps attention cost
+    tokenizer.model_max_length = 1024
+    return pipeline("summarization", model=load_quantized_summarizer(), tokenizer=tokenizer, device=-1)
 
-nlp, summarizer = load_models()
+# -----------------------------------------------------------
+# HTTP Session (connection pooling + TLS reuse across requests)
+# -----------------------------------------------------------
+# Cached so the pool survives Streamlit reruns instead of being rebuilt on every interaction
+@st.cache_resource
+def get_session():
+    """Creates and caches a pooled requests Session shared across reruns."""
+    session = requests.Session()
+    session.headers.update({"User-Agent": "Mozilla/5.0 (compatible; NewsOrchestrator/1.0)"})
+    adapter = requests.adapters.HTTPAdapter(pool_connections=16, pool_maxsize=16)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 # -----------------------------------------------------------
 # Helper Functions
 # -----------------------------------------------------------
+@st.cache_data(ttl=600, show_spinner=False)
+def fetch_rss_articles(topic, max_articles=15):
+    """Downloads and parses the Google News RSS feed (cached per topic for 10 minutes)."""
+    url = f"https://news.google.com/rss/search?q={topic.replace(' ', '+')}"
+    r = get_session().get(url, timeout=10)
+    # Raise on HTTP errors so they escape the cache instead of memoizing an empty feed
+    r.raise_for_status()
+    articles = []
+    # Stream <item> elements instead of building the whole DOM; stop once we have enough
+    for _, item in etree.iterparse(BytesIO(r.content), events=("end",), tag="item"):
+        title = item.findtext("title", "")
+        desc = item.findtext("description", "")
+        link = item.findtext("link") or "#" 
+        source = item.findtext("source") or "Unknown"
+        articles.append({"title": title, "content": desc, "source": source, "link": link})
+        item.clear()
+        if len(articles) >= max_articles:
+            break
+    return pd.DataFrame(articles, columns=["title", "content", "source", "link"])
+
+
 def fetch_news_rss(topic, max_articles=15):
     """Fetches articles from Google News RSS feed."""
-    url = f"https://news.google.com/rss/search?q={topic.replace(' ', '+')}"
     try:
-        r = requests.get(url, timeout=10)
-        soup = BeautifulSoup(r.content, "xml")
-        items = soup.find_all("item")[:max_articles]
-        articles = []
-        for item in items:
-            title = item.title.text if item.title else ""
-            desc = item.description.text if item.description else ""
-            link = item.link.text if item.link else "#" 
-            source = item.source.text if item.source else "Unknown"
-            articles.append({"title": title, "content": desc, "source": source, "link": link})
-        return pd.DataFrame(articles)
+        # Errors are raised out of the cached call so a failed fetch is never memoized
+        return fetch_rss_articles(topic, max_articles)
     except Exception as e:
         st.error(f"Error fetching news: {e}")
         return pd.DataFrame(columns=["title", "content", "source", "link"])
 
 
-def clean_text(t):
-    """Removes HTML and normalizes whitespace."""
-    t = re.sub(r"<.*?>", "", str(t))
-    return re.sub(r"\s+", " ", t).strip()
+_TAG_RE = re.compile(r"<.*?>")
+_WS_RE = re.compile(r"\s+")
+
+
+def clean_text(content):
+    """Removes HTML and normalizes whitespace for a whole column of text at once."""
+    return (
+        content.astype(str)
+        .str.replace(_TAG_RE, "", regex=True)
+        .str.replace(_WS_RE, " ", regex=True)
+        .str.strip()
+    )
 
 
-def summarize_articles(texts):
+@st.cache_data(show_spinner=False)
+def summarize_articles(texts, word_counts):
     """
     Generates a progressive, fact-based summary. 
     NOTE: The text filtering is now handled *before* calling this function.
+    word_counts are the spaCy word counts (punctuation excluded) of each text, reused to gate summarization.
     """
     if not texts:
         # Fallback should theoretically never be hit now
         return "No text available for summary (unexpected error)."
 
-    individual_summaries = []
-    for text in texts:
+    # Skip summarization if input is literally just a title (very short)
+    to_summarize = [i for i, count in enumerate(word_counts) if count >= 5]
+    individual_summaries = list(texts)
+
+    if to_summarize:
+        summarizer = load_summarizer()
+        summary_args = dict(max_length=100, min_length=30, do_sample=False, truncation=True)
         try:
-            # Skip summarization if input is literally just a title (very short)
-            if len(text.split()) < 5: 
-                individual_summaries.append(text)
-                continue
-            
-            summary_piece = summarizer(
-                text, 
-                max_length=100, 
-                min_length=30, 
-                do_sample=False
-            )[0]["summary_text"]
-            individual_summaries.append(summary_piece)
-        except:
-            # If summarization fails (e.g., token error), use the input text as a fallback
-            individual_summaries.append(text) 
+            # One batched call lets the pipeline tokenize and run the model per batch
+            results = summarizer([texts[i] for i in to_summarize], batch_size=8, **summary_args)
+            for i, result in zip(to_summarize, results):
+                individual_summaries[i] = result["summary_text"]
+        except SUMMARIZER_ERRORS:
+            # Retry one article at a time so a single bad input only falls back on its own
+            for i in to_summarize:
+                try:
+                    individual_summaries[i] = summarizer(texts[i], **summary_args)[0]["summary_text"]
+                except SUMMARIZER_ERRORS:
+                    # If summarization fails (e.g., token error), use the input text as a fallback
+                    pass
 
     final_summary = " ".join(individual_summaries)
     
@@ -186,34 +303,82 @@ def summarize_articles(texts):
     return final_summary[:1000] + "..." if len(final_summary) > 1000 else final_summary
 
 
-def generate_timeline(df):
-    """Uses spaCy NER to extract chronological milestones from articles."""
+MAX_EVENTS = 200
+# Integer label IDs, so the NER filter compares ints instead of label strings
+TIMELINE_LABELS = (DATE, EVENT)
+FAST_YEAR = re.compile(r"^(19|20)\d{2}$")
+# Calendar-aware offsets, so "last month" on the 31st stays in the previous month
+RELATIVE_OFFSETS = {
+    "today": relativedelta(),
+    "yesterday": relativedelta(days=1),
+    "this week": relativedelta(),
+    "last week": relativedelta(weeks=1),
+    "this month": relativedelta(),
+    "last month": relativedelta(months=1),
+    "last year": relativedelta(years=1),
+}
+MONTHS = {name.lower(): i for i, name in enumerate(calendar.month_name) if name}
+
+
+def fast_parse(text, today):
+    """Handles the common English news date forms without dateparser; returns None if unsure."""
+    if FAST_YEAR.match(text):
+        return datetime(int(text), 1, 1)
+    try:
+        # ISO dates like "2024-03-01" are parsed by the C extension
+        return ciso8601.parse_datetime(text).replace(tzinfo=None)
+    except ValueError:
+        pass
+    key = text.lower().strip()
+    if key in RELATIVE_OFFSETS:
+        return today - RELATIVE_OFFSETS[key]
+    if key in MONTHS:
+        # A bare month name refers to its most recent occurrence
+        month = MONTHS[key]
+        return datetime(today.year if month <= today.month else today.year - 1, month, 1)
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(text, today_iso):
+    """Normalizes a date entity, falling back to dateparser only when the fast path fails."""
+    parsed = fast_parse(text, datetime.fromisoformat(today_iso))
+    if parsed:
+        return parsed
+    return dateparser.parse(text, settings={'RELATIVE_BASE': pd.to_datetime(today_iso), 'PREFER_DATES_FROM': 'past'})
+
+
+def generate_timeline(docs, meta, today_iso):
+    """
+    Uses spaCy NER results (one doc per article) to extract chronological milestones.
+    today_iso is the base for relative dates ("last week").
+    """
     timeline_events = []
     
-    # Ensure the combined_text column exists (created in the main block)
-    if 'combined_text' not in df.columns:
+    if not docs:
         return []
     
-    for index, row in df.iterrows():
-        # Use the combined text for NER
-        doc = nlp(row['combined_text'])
+    for doc, row in zip(docs, meta):
         article_title = row['title'] 
         
-        for ent in doc.ents:
-            if ent.label_ == "DATE" or ent.label_ == "EVENT":
-                
-                sentence = ent.sent.text.strip()
-                
-                if len(sentence.split()) < 5: 
-                    continue 
+        # Walk sentences once so each sentence is stripped/split only once, not per entity
+        for sent in doc.sents:
+            timeline_ents = [ent for ent in sent.ents if ent.label in TIMELINE_LABELS]
+            if not timeline_ents:
+                continue
 
-                milestone = sentence.replace(article_title, "").strip()
-                
-                if not milestone:
-                    continue
+            sentence = sent.text.strip()
+            
+            if len(sentence.split()) < 5: 
+                continue 
 
-                # Corrected dateparser setting
-                parsed_date = dateparser.parse(ent.text, settings={'RELATIVE_BASE': pd.to_datetime('today'), 'PREFER_DATES_FROM': 'past'})
+            milestone = sentence.replace(article_title, "").strip().capitalize()
+            
+            if not milestone:
+                continue
+
+            for ent in timeline_ents:
+                parsed_date = _parse_date(ent.text, today_iso)
                 
                 if parsed_date:
                     date_str = parsed_date.strftime("%Y-%m-%d")
@@ -221,37 +386,54 @@ def generate_timeline(df):
                     timeline_events.append({
                         "date": parsed_date,
                         "date_str": date_str,
-                        "milestone": milestone.capitalize(), 
+                        "milestone": milestone, 
                         "source": row['source'],
                         "link": row['link']
                     })
 
-    # Remove duplicates and sort chronologically
-    unique_events = {}
+    # Remove duplicates (keeping first occurrence, capped at MAX_EVENTS) and sort chronologically
+    seen = set()
+    unique_events = []
     for event in timeline_events:
         key = (event['date_str'], event['milestone'])
-        if key not in unique_events:
-            unique_events[key] = event
+        if key in seen:
+            continue
+        seen.add(key)
+        unique_events.append(event)
+        if len(unique_events) >= MAX_EVENTS:
+            break
     
-    sorted_timeline = sorted(unique_events.values(), key=lambda x: (x['date'], x['source']))
+    sorted_timeline = sorted(unique_events, key=lambda x: (x['date'], x['source']))
     
     return sorted_timeline
 
 
-def score_source(source, df):
-    """Calculates a rudimentary score based on content depth."""
-    arts = df[df["source"] == source]
-    if arts.empty:
-        return 0
-    length = np.mean(arts["content"].apply(lambda x: len(str(x).split())))
-    return min(1.0, length / 200)
+@st.cache_data(show_spinner=False)
+def analyze_articles(texts, meta, today_iso):
+    """
+    Runs spaCy over the articles once (cached on texts, metadata and today's date).
+    Returns the word counts used to gate summarization and the extracted timeline.
+    """
+    docs = list(load_nlp().pipe(texts, batch_size=16))
+    # Skip punctuation/whitespace tokens so the count matches the "5 words" threshold
+    word_counts = tuple(sum(not (t.is_punct or t.is_space) for t in doc) for doc in docs)
+    return word_counts, generate_timeline(docs, meta, today_iso)
+
 
+def score_sources(df):
+    """Calculates a rudimentary per-article score based on the average content depth of its source."""
+    word_counts = df["content"].astype(str).str.split().str.len()
+    scores = word_counts.groupby(df["source"]).mean().clip(upper=200) / 200
+    return df["source"].map(scores)
 
-def create_gauge(score):
-    """Creates a Plotly Gauge chart for reliability score."""
+
+# cache_resource hands back the same Figure object (never mutated) instead of unpickling a copy
+@st.cache_resource(show_spinner=False)
+def create_gauge(score_bucket):
+    """Creates a Plotly Gauge chart for reliability score (0-100, cached per whole-number bucket)."""
     fig = go.Figure(go.Indicator(
         mode="gauge+number",
-        value=score * 100,
+        value=score_bucket,
         gauge={
             "axis": {"range": [0, 100]},
             "bar": {"color": "#10b981"}, 
@@ -303,24 +485,25 @@ if generate:
         st.session_state.df = df
         
         if not df.empty:
-            df["clean"] = df["content"].apply(clean_text)
+            df["clean"] = clean_text(df["content"])
             
             # --- CRITICAL MODIFICATION: Use title as fallback if content is too short ---
-            def get_combined_text(row):
-                # If cleaned content is less than 5 words, use the title instead
-                if len(row['clean'].split()) < 5:
-                    return row['title']
-                return row['clean']
-                
-            df['combined_text'] = df.apply(get_combined_text, axis=1)
+            # If cleaned content is less than 5 words, use the title instead
+            short_content = df['clean'].str.split().str.len() < 5
+            df['combined_text'] = np.where(short_content, df['title'], df['clean'])
             combined_texts = df['combined_text'].tolist()
             # -------------------------------------------------------------------------
             
-            st.session_state.summary = summarize_articles(combined_texts)
+            # Run spaCy once: its docs feed the timeline and their word counts gate summarization
+            word_counts, timeline = analyze_articles(
+                tuple(combined_texts), df[['title', 'source', 'link']].to_dict('records'), date.today().isoformat()
+            )
+            
+            st.session_state.summary = summarize_articles(tuple(combined_texts), word_counts)
             # st.session_state.narrative is removed here
-            st.session_state.timeline = generate_timeline(df)
+            st.session_state.timeline = timeline
             
-            df["reliability"] = df["source"].apply(lambda s: score_source(s, df))
+            df["reliability"] = score_sources(df)
             st.session_state.avg_score = float(df["reliability"].mean())
         else:
             st.warning("Could not fetch articles for this topic. Check your internet or try a different topic.")
@@ -354,18 +537,17 @@ with left_main:
             
             # Use a scrollable container for the timeline
             with st.container(height=280): 
-                for event in st.session_state.timeline:
-                    milestone_text = event['milestone']
-                    
-                    st.markdown(f"""
+                # Build every event's HTML first and send it to the frontend in one message
+                timeline_html = "".join(f"""
                     <div class='timeline-event'>
                         <div class='timeline-date'>🗓️ {event['date_str']}</div>
-                        **Milestone:** {milestone_text}
+                        **Milestone:** {event['milestone']}
                         <p style='font-size:12px; margin-top:5px; color:#6b7280;'>Source: 
                             <a href='{event['link']}' target='_blank' style='color:#3b82f6;'>{event['source']}</a>
                         </p>
                     </div>
-                    """, unsafe_allow_html=True)
+                    """ for event in st.session_state.timeline)
+                st.markdown(timeline_html, unsafe_allow_html=True)
         elif st.session_state.df.empty and not generate:
             st.info("Click 'Generate Dashboard' in the sidebar to view the chronological timeline.")
         else:
@@ -382,13 +564,16 @@ with right_metrics:
         # 4. METRICS CARD
         st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.markdown("#### Key Metrics")
-        st.markdown(f"<div class='metric'>📝 <b>{articles}</b> Articles Fetched</div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='metric'>📌 <b>{len(st.session_state.timeline)}</b> Milestones Extracted</div>", unsafe_allow_html=True)
-        st.markdown(f"<div class='metric'>📰 <b>{sources}</b> Unique Sources</div>", unsafe_allow_html=True)
+        st.markdown(
+            f"<div class='metric'>📝 <b>{articles}</b> Articles Fetched</div>"
+            f"<div class='metric'>📌 <b>{len(st.session_state.timeline)}</b> Milestones Extracted</div>"
+            f"<div class='metric'>📰 <b>{sources}</b> Unique Sources</div>",
+            unsafe_allow_html=True
+        )
         st.markdown("</div>", unsafe_allow_html=True)
 
         # 5. RELIABILITY CARD
         st.markdown("<div class='card'>", unsafe_allow_html=True)
         st.markdown("#### Source Reliability Score (Content Depth)")
-        st.plotly_chart(create_gauge(st.session_state.avg_score), use_container_width=True)
+        st.plotly_chart(create_gauge(round(st.session_state.avg_score * 100)), use_container_width=True)
         st.markdown("</div>", unsafe_allow_html=True)
\ No newline at end of file